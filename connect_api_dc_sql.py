@@ -1,51 +1,255 @@
-import json
+import asyncio
+import functools
 import logging
+import operator
+import re
 import time
-from typing import Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
+from urllib.parse import urlencode
 
-import requests
+import httpx
+import ijson
+import orjson
 
 from oauth import OAuthSession, OAuthConfig
 
+if TYPE_CHECKING:
+    import pyarrow as pa
+
 # Get logger for this module
 logger = logging.getLogger(__name__)
 
+# Upper bound on concurrent page fetches; must not exceed the client's max_connections
+MAX_PAGINATION_WORKERS = 8
+
+# Pages after the first are shrunk to take roughly this long to fetch, but not below the minimum
+TARGET_SECONDS_PER_PAGE = 2.0
+MIN_PAGINATION_BATCH_SIZE = 25000
+
+# Oldest pyarrow release supported by output_format="arrow"
+MIN_PYARROW_MAJOR_VERSION = 14
+
+# Server-side long-poll wait per status request; a single poll usually covers the whole query
+POLL_WAIT_TIME_MS = 50000
+# Client timeout for a poll must outlast the server-side wait
+POLL_TIMEOUT_S = max(POLL_WAIT_TIME_MS / 1000 + 5, 30)
+
+
+def _loads(response: httpx.Response):
+    return orjson.loads(response.content)
+
+
+def _row_count(payload: dict) -> int:
+    # rowCount may be absent while the query is still running
+    row_count = payload.get("rowCount")
+    return int(row_count) if row_count is not None else 0
+
+
+def _adapt_batch_size(returned_rows: int, elapsed: float, max_batch_size: int) -> int:
+    # Scale the page size to the observed throughput so each page takes about TARGET_SECONDS_PER_PAGE.
+    # Never go above max_batch_size: the server may cap rows per page below what was asked for.
+    target = int(returned_rows / max(elapsed, 0.01) * TARGET_SECONDS_PER_PAGE)
+    return min(max(target, MIN_PAGINATION_BATCH_SIZE), max_batch_size)
+
+
+def _metadata_columns(metadata) -> list:
+    if isinstance(metadata, dict):
+        return [{"name": name, **(column if isinstance(column, dict) else {})}
+                for name, column in metadata.items()]
+    if isinstance(metadata, list):
+        return [column if isinstance(column, dict) else {} for column in metadata]
+    return []
+
+
+def _column_names(metadata, width: int) -> list[str]:
+    names = [column.get("name") for column in _metadata_columns(metadata)]
+    return [names[i] if i < len(names) and names[i] else f"column_{i}" for i in range(width)]
+
+
+# Connect API column types mapped to the Arrow type name used for every page of a column
+_ARROW_TYPE_NAMES = {
+    "BOOLEAN": "bool_",
+    "TINYINT": "int64",
+    "SMALLINT": "int64",
+    "INTEGER": "int64",
+    "INT": "int64",
+    "BIGINT": "int64",
+    "DECIMAL": "float64",
+    "NUMERIC": "float64",
+    "NUMBER": "float64",
+    "REAL": "float64",
+    "FLOAT": "float64",
+    "DOUBLE": "float64",
+    "CHAR": "string",
+    "VARCHAR": "string",
+    "TEXT": "string",
+    "STRING": "string",
+    "DATE": "string",
+    "TIME": "string",
+    "TIMESTAMP": "string",
+    "TIMESTAMPTZ": "string",
+}
+
+
+def _arrow_types(metadata, width: int) -> list:
+    import pyarrow as pa
+
+    columns = _metadata_columns(metadata)
+    types = []
+    for i in range(width):
+        column = columns[i] if i < len(columns) else {}
+        # Types may carry precision, e.g. "DECIMAL(18,2)" or "VARCHAR(255)"
+        type_name = str(column.get("type") or "").split("(")[0].strip().upper()
+        arrow_type_name = _ARROW_TYPE_NAMES.get(type_name)
+        types.append(getattr(pa, arrow_type_name)() if arrow_type_name else None)
+    return types
+
+
+def _rows_to_table(rows: list, metadata) -> "pa.Table":
+    import pyarrow as pa
+
+    width = len(rows[0]) if rows else len(_metadata_columns(metadata))
+    columns = list(zip(*rows)) if rows else [()] * width
+    # Types come from the result metadata so every page of a column gets the same type;
+    # columns with an unknown type are inferred and unified when pages are concatenated
+    types = _arrow_types(metadata, width)
+    return pa.Table.from_arrays([pa.array(column, type=column_type) for column, column_type in zip(columns, types)],
+                                names=_column_names(metadata, width))
+
+
+def _error_field_patterns(name: str) -> tuple[re.Pattern, re.Pattern]:
+    # The error details arrive as a JSON string nested in the outer JSON payload, so on the wire the
+    # field is escaped once more (\"name\": \"value\"); the plain form is matched as a fallback
+    nested = re.compile(rb'\\"' + name.encode() +
+                        rb'\\"\s*:\s*\\"((?:[^"\\]|\\\\(?:\\.|[^"\\])|\\[^"\\])*)\\"')
+    plain = re.compile(rb'"' + name.encode() +
+                       rb'"\s*:\s*"((?:[^"\\]|\\.)*)"')
+    return nested, plain
+
+
+_PRIMARY_MESSAGE_PATTERNS = _error_field_patterns("primaryMessage")
+_CUSTOMER_HINT_PATTERNS = _error_field_patterns("customerHint")
+
+
+def _extract_error_field(content: bytes, patterns: tuple[re.Pattern, re.Pattern]) -> Optional[str]:
+    nested, plain = patterns
+    match = nested.search(content)
+    if match:
+        # Undo the outer JSON escaping, then the inner one
+        inner = orjson.loads(b'"' + match.group(1) + b'"')
+        return orjson.loads(f'"{inner}"')
+    match = plain.search(content)
+    if match:
+        return orjson.loads(b'"' + match.group(1) + b'"')
+    return None
+
+
+@functools.lru_cache(maxsize=32)
+def _error_message(content: bytes) -> Optional[str]:
+    """Build the user-facing message for an error body; cached since transient errors tend to repeat"""
+    try:
+        primary_message = _extract_error_field(
+            content, _PRIMARY_MESSAGE_PATTERNS)
+        if primary_message:
+            customer_hint = _extract_error_field(
+                content, _CUSTOMER_HINT_PATTERNS)
+            return f"{primary_message} Hint: {customer_hint}" if customer_hint else primary_message
+    except Exception:
+        pass
+
+    # Connect API error format: list with first element containing JSON string in "message"
+    try:
+        payload = orjson.loads(content)
+        errors_details_json = payload[0].get("message", "") if isinstance(
+            payload, list) and payload else ""
+        if errors_details_json and orjson.loads(errors_details_json):
+            return errors_details_json
+    except Exception:
+        pass
+    return None
+
+
+class ConnectAPIError(Exception):
+    """Error returned by the Connect API, or an unexpected response shape from it"""
 
-def _handle_error_response(response: requests.Response):
-    if response.status_code >= 300:
-        # Parse error message from response
+    def __init__(self, status: int, reason: str, message: str):
+        super().__init__(status, reason, message)
+        self.status = status
+        self.reason = reason
+        self.message = message
+
+
+def _handle_error_response(response: httpx.Response):
+    if response.is_success:
+        return
+
+    # Fall back to the raw body when it does not follow the Connect API error format
+    message = _error_message(response.content)
+    if message is None:
         message = response.text
-        try:
-            payload = json.loads(response.text)
-            # Connect API error format: list with first element containing JSON string in "message"
-            if isinstance(payload, list) and len(payload) > 0:
-                structured_message = payload[0]
-                try:
-                    errors_details_json = structured_message.get("message", "")
-                    details = json.loads(
-                        errors_details_json) if errors_details_json else None
-                    if details:
-                        message = errors_details_json
-                except Exception:
-                    pass
-        except Exception:
-            pass
-
-        # Raise exception with error message
-        raise Exception(
-            response.status_code,
-            response.reason,
-            message,
-        )
-
-
-def run_query(
+
+    raise ConnectAPIError(
+        response.status_code,
+        response.reason_phrase,
+        message,
+    )
+
+
+async def _fetch_page(
+    session: httpx.AsyncClient,
+    base_rows_url: str,
+    offset: int,
+    flatten_column: Optional[int] = None,
+) -> list:
+    logger.debug("Fetching rows: offset=%d", offset)
+
+    # Stream the page body and decode rows as they arrive, so the raw JSON is never
+    # buffered in full next to the parsed rows
+    chunk_rows: list = []
+    async with session.stream("GET", f"{base_rows_url}&offset={offset}", timeout=120) as rows_response:
+        if not rows_response.is_success:
+            # Streamed responses have not loaded their body yet
+            await rows_response.aread()
+        _handle_error_response(rows_response)
+
+        decoded_rows = ijson.sendable_list()
+        parser = ijson.items_coro(decoded_rows, "data.item", use_float=True)
+        # Project a single column as rows arrive so full rows are never kept for flattened queries
+        project = operator.itemgetter(
+            flatten_column) if flatten_column is not None else None
+        async for data in rows_response.aiter_bytes():
+            parser.send(data)
+            chunk_rows.extend(
+                map(project, decoded_rows) if project else decoded_rows)
+            del decoded_rows[:]
+        parser.close()
+        chunk_rows.extend(
+            map(project, decoded_rows) if project else decoded_rows)
+
+    # elapsed is only available once the streamed response is closed
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Rows fetch response: status=%d, elapsed=%.2fs",
+                     rows_response.status_code, rows_response.elapsed.total_seconds())
+
+    returned_rows = len(chunk_rows)
+    if returned_rows == 0:
+        raise ConnectAPIError(500, "MissingRows",
+                              "Expected rows to be returned, but received 0.")
+
+    logger.debug("Retrieved %d rows at offset %d", returned_rows, offset)
+    return chunk_rows
+
+
+async def run_query(
     oauth_session: OAuthSession,
     sql: str,
+    parameters: Optional[List[Dict[str, str]]] = None,
     dataspace: str = "default",
     workload_name: str | None = "data-360-mcp-query-oss",
     pagination_batch_size: int = 100000,
-) -> Dict[str, Union[List, str]]:
+    flatten_column: Optional[int] = None,
+    output_format: str = "python",
+) -> Dict[str, Union[List, str, "pa.Table"]]:
     """
     Execute a SQL query using the Data Cloud Query Connect API, handling long-running queries
     and paginated result retrieval.
@@ -53,11 +257,32 @@ def run_query(
     Returns a dictionary containing:
     - 'data': the complete list of rows (aggregated across all pages) or "(empty)" if no rows
     - 'metadata': the schema/metadata of the result columns
+
+    parameters are passed through as the request's sqlParameters, bound to :name placeholders in sql.
+    When flatten_column is set, 'data' holds only the values of that column instead of full rows.
+    With output_format="arrow" (requires pyarrow>=14), 'data' is a pyarrow.Table built page by page, so rows never exist
+    as Python objects all at once; call .to_pylist() where plain Python values are needed.
+    pagination_batch_size sizes the first page fetched; later pages may be made smaller based on its
+    observed throughput, and never larger than the rows the first page actually returned.
     """
-    base_url = oauth_session.get_instance_url()
-    token = oauth_session.get_token()
+    if output_format not in ("python", "arrow"):
+        raise ValueError(f"Unsupported output_format: {output_format}")
+    if output_format == "arrow":
+        if flatten_column is not None:
+            raise ValueError(
+                "flatten_column cannot be combined with output_format='arrow'")
+        try:
+            import pyarrow
+        except ImportError as e:
+            raise ImportError(
+                "output_format='arrow' requires pyarrow>=14: pip install 'pyarrow>=14'") from e
+        # concat_tables(promote_options=...) was added in pyarrow 14
+        if int(pyarrow.__version__.split(".")[0]) < MIN_PYARROW_MAJOR_VERSION:
+            raise ImportError(
+                f"output_format='arrow' requires pyarrow>=14, found {pyarrow.__version__}: pip install 'pyarrow>=14'")
+
+    base_url, session = await oauth_session.get_authorized_session()
 
-    headers = {"Authorization": f"Bearer {token}"}
     url_base = base_url + "/services/data/v63.0/ssot/query-sql"
     common_params: dict[str, str] = {"dataspace": dataspace}
     if workload_name:
@@ -65,85 +290,152 @@ def run_query(
 
     # Step 1: submit the query
     submit_body = {"sql": sql}
-    logger.info(
-        f"Submitting SQL query to {url_base}, with params: {common_params}")
+    if parameters:
+        submit_body["sqlParameters"] = parameters
+    logger.info("Submitting SQL query to %s, with params: %s",
+                url_base, common_params)
 
-    submit_response = requests.post(
-        url_base, json=submit_body, params=common_params, headers=headers, timeout=120)
+    submit_response = await session.post(
+        url_base, json=submit_body, params=common_params, timeout=120)
 
-    logger.info(
-        f"Query submission response: status={submit_response.status_code}, elapsed={submit_response.elapsed.total_seconds():.2f}s")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Query submission response: status=%d, elapsed=%.2fs",
+                    submit_response.status_code, submit_response.elapsed.total_seconds())
     _handle_error_response(submit_response)
 
-    submit_payload = submit_response.json()
+    submit_payload = _loads(submit_response)
     status_obj = submit_payload.get("status", {})
     query_id = status_obj.get("queryId") or submit_payload.get("queryId")
     if not query_id:
-        raise Exception(500, "MissingQueryId",
-                        "Query ID not returned by the API.")
+        raise ConnectAPIError(500, "MissingQueryId",
+                              "Query ID not returned by the API.")
 
     # Collect initial rows and metadata if present
     rows: list = submit_payload.get("data", []) or []
+    if flatten_column is not None:
+        rows = list(map(operator.itemgetter(flatten_column), rows))
     metadata = submit_payload.get("metadata", [])
     completion = status_obj.get("completionStatus")
-    total_row_count = int(status_obj.get("rowCount"))
+    total_row_count = _row_count(status_obj)
 
     # Step 2: poll for completion when needed (long-polling via waitTimeMs)
     poll_count = 0
+    # Signal that we want to do long-polling to get best latency for query end notification and minimize RPC calls
+    poll_url = f"{url_base}/{query_id}?{urlencode({**common_params, 'waitTimeMs': POLL_WAIT_TIME_MS})}"
     while completion not in ["Finished", "ResultsProduced"]:
         poll_count += 1
-        poll_url = f"{url_base}/{query_id}"
-        logger.debug(
-            f"Polling query status (attempt {poll_count}): {poll_url}")
-
-        poll_params = dict(common_params)
-        # Signal that we want to do long-polling to get best latency for query end notification and minimize RPC calls
-        poll_params.update({
-            "waitTimeMs": 10000,
-        })
-        poll_response = requests.get(
-            poll_url, params=poll_params, headers=headers, timeout=120)
-
-        logger.debug(
-            f"Poll response: status={poll_response.status_code}, elapsed={poll_response.elapsed.total_seconds():.2f}s")
+        logger.debug("Polling query status (attempt %d): %s",
+                     poll_count, poll_url)
+
+        poll_response = await session.get(poll_url, timeout=POLL_TIMEOUT_S)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Poll response: status=%d, elapsed=%.2fs",
+                         poll_response.status_code, poll_response.elapsed.total_seconds())
         _handle_error_response(poll_response)
-        poll_payload = poll_response.json()
+        poll_payload = _loads(poll_response)
         completion = poll_payload.get("completionStatus")
-        total_row_count = int(poll_payload.get("rowCount"))
-
-    # Step 3: retrieve remaining rows via pagination
-    while len(rows) < total_row_count:
-        rows_params = dict(common_params)
-        rows_params.update({
-            "rowLimit": pagination_batch_size,
-            "offset": len(rows),
-            "omitSchema": "true",
-        })
-
-        rows_url = f"{url_base}/{query_id}/rows"
-        logger.debug(
-            f"Fetching rows: offset={rows_params.get('offset')}, limit={rows_params.get('rowLimit')}")
-
-        rows_response = requests.get(
-            rows_url, params=rows_params, headers=headers, timeout=120)
-
-        logger.debug(
-            f"Rows fetch response: status={rows_response.status_code}, elapsed={rows_response.elapsed.total_seconds():.2f}s")
-        _handle_error_response(rows_response)
+        if completion in ["Finished", "ResultsProduced"]:
+            total_row_count = _row_count(poll_payload)
+
+    # Step 3: retrieve remaining rows via pagination. The first page is fetched on its own to
+    # measure throughput and the server's page cap, which bound the size of the remaining pages. Those offsets are then all
+    # known, so they are fetched concurrently and written into disjoint slices of a
+    # preallocated result list. A page shorter than requested is completed by fetching the
+    # missing range from where it ended.
+    initial_row_count = len(rows)
+    # Arrow pages are converted as they arrive and concatenated in offset order at the end
+    page_tables: dict[int, "pa.Table"] = {}
+    if initial_row_count < total_row_count:
+        if output_format == "arrow":
+            if rows:
+                page_tables[0] = _rows_to_table(rows, metadata)
+        else:
+            rows_out: list = [None] * total_row_count
+            rows_out[:initial_row_count] = rows
+
+        def rows_url(batch_size: int) -> str:
+            # Static query string is encoded once per page size; only the offset varies per page
+            return f"{url_base}/{query_id}/rows?" + urlencode({
+                **common_params,
+                "omitSchema": "true",
+                "rowLimit": batch_size,
+            })
 
-        chunk = rows_response.json()
-        chunk_rows = chunk.get("data", []) or []
-        returned_rows = int(chunk.get("returnedRows", len(chunk_rows)))
+        def place_page(offset: int, chunk_rows: list):
+            if output_format == "arrow":
+                page_tables[offset] = _rows_to_table(chunk_rows, metadata)
+            else:
+                rows_out[offset:offset + len(chunk_rows)] = chunk_rows
+
+        async def fetch_range(start: int, end: int, url: str):
+            # Rows past end belong to the next range; a short page continues with a narrower request
+            offset = start
+            while offset < end:
+                chunk_rows = await _fetch_page(session, url, offset, flatten_column)
+                chunk_rows = chunk_rows[:end - offset]
+                place_page(offset, chunk_rows)
+                offset += len(chunk_rows)
+                if offset < end:
+                    logger.debug("Short page, fetching missing rows %d-%d",
+                                 offset, end)
+                    url = rows_url(end - offset)
+
+        started = time.monotonic()
+        chunk_rows = await _fetch_page(
+            session, rows_url(pagination_batch_size), initial_row_count, flatten_column)
+        elapsed = time.monotonic() - started
+        chunk_rows = chunk_rows[:total_row_count - initial_row_count]
+        first_page_rows = len(chunk_rows)
+        place_page(initial_row_count, chunk_rows)
+        del chunk_rows
+
+        # A first page shorter than asked for (and not the last) reveals the server's page cap
+        batch_size = _adapt_batch_size(
+            first_page_rows, elapsed, min(pagination_batch_size, first_page_rows))
+
+        logger.debug("First page took %.2fs, using batch size %d for remaining pages",
+                     elapsed, batch_size)
+        offsets = range(initial_row_count + first_page_rows,
+                        total_row_count, batch_size)
+        base_rows_url = rows_url(batch_size)
+
+        # Bound in-flight requests; pages are multiplexed as HTTP/2 streams on the shared client
+        semaphore = asyncio.Semaphore(MAX_PAGINATION_WORKERS)
+
+        async def fetch_page(offset: int):
+            async with semaphore:
+                await fetch_range(offset, min(offset + batch_size, total_row_count), base_rows_url)
+
+        tasks = [asyncio.ensure_future(fetch_page(offset))
+                 for offset in offsets]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Stop the remaining page fetches so none keeps running after run_query has raised
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        if output_format != "arrow":
+            rows = rows_out
 
-        if returned_rows == 0:
-            raise Exception(500, "MissingRows",
-                            "Expected rows to be returned, but received 0.")
+    if output_format == "arrow":
+        import pyarrow as pa
 
-        rows.extend(chunk_rows)
-        logger.debug(
-            f"Retrieved {returned_rows} rows, total so far: {len(rows)}")
+        if not page_tables:
+            page_tables[0] = _rows_to_table(rows, metadata)
+        # Permissive promotion unifies inferred column types that differ between pages,
+        # e.g. all-null vs. string or int64 vs. double
+        data = pa.concat_tables([page_tables[offset] for offset in sorted(page_tables)],
+                                promote_options="permissive")
+        logger.info("Query completed: retrieved %d total rows", data.num_rows)
+        return {
+            "data": data,
+            "metadata": metadata
+        }
 
-    logger.info(f"Query completed: retrieved {len(rows)} total rows")
+    logger.info("Query completed: retrieved %d total rows", len(rows))
     return {
         "data": rows,
         "metadata": metadata
@@ -164,7 +456,7 @@ if __name__ == "__main__":
     sf_org: OAuthConfig = OAuthConfig.from_env()
     oauth_session: OAuthSession = OAuthSession(sf_org)
 
-    result = run_query(OAuthSession(OAuthConfig.from_env(
-    )), "SELECT g::text || rpad(1::text,100) as a, g as b FROM generate_series(1, 40000) g ORDER BY b DESC")
+    result = asyncio.run(run_query(oauth_session,
+                                   "SELECT g::text || rpad(1::text,100) as a, g as b FROM generate_series(1, 40000) g ORDER BY b DESC"))
     print(f"Query result: {len(result['data'])} rows returned")
     print(result)
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 import logging
 import os
 import sys
@@ -12,9 +14,10 @@ from threading import Thread
 import http.server
 import webbrowser
 from urllib.parse import parse_qs, urlparse
+from urllib.request import getproxies
 from typing import Tuple
 
-import requests
+import httpx
 from rfc3986 import builder as uri_builder
 
 # Get logger for this module
@@ -83,14 +86,132 @@ def _generate_pkce_pair() -> Tuple[str, str]:
     return code_verifier, code_challenge
 
 
+# Request extension that opts a single request out of status retries, e.g. non-idempotent POSTs
+NO_STATUS_RETRY = "no_status_retry"
+
+
+def _retry_after_seconds(response: httpx.Response) -> float | None:
+    """Parse a Retry-After header given either as delay seconds or as an HTTP date"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class _RetryTransport(httpx.AsyncBaseTransport):
+    """Retry requests that fail with a transient HTTP status, with exponential backoff.
+
+    A Retry-After header on 413/429/503 responses extends the wait, up to max_retry_after seconds.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, total: int = 3, backoff_factor: float = 0.2,
+                 status_forcelist: frozenset[int] = frozenset({429, 500, 502, 503, 504}),
+                 max_retry_after: float = 120.0):
+        self._transport = transport
+        self._total = total
+        self._backoff_factor = backoff_factor
+        self._status_forcelist = status_forcelist
+        self._max_retry_after = max_retry_after
+
+    def _retry_delay(self, response: httpx.Response, attempt: int) -> float:
+        backoff = self._backoff_factor * (2 ** attempt)
+        retry_after = _retry_after_seconds(
+            response) if response.status_code in (413, 429, 503) else None
+        if retry_after is None:
+            return backoff
+        return max(backoff, min(retry_after, self._max_retry_after))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.extensions.get(NO_STATUS_RETRY):
+            return await self._transport.handle_async_request(request)
+        for attempt in range(self._total):
+            response = await self._transport.handle_async_request(request)
+            if response.status_code not in self._status_forcelist:
+                return response
+            delay = self._retry_delay(response, attempt)
+            await response.aclose()
+            await asyncio.sleep(delay)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _environment_proxy_mounts() -> dict[str, str | None]:
+    """Map httpx mount patterns to the proxies from HTTP(S)_PROXY / ALL_PROXY, with None for NO_PROXY hosts"""
+    proxy_info = getproxies()
+    no_proxy_hosts = [host.strip()
+                      for host in proxy_info.get("no", "").split(",") if host.strip()]
+    if "*" in no_proxy_hosts:
+        return {}
+
+    mounts: dict[str, str | None] = {}
+    for scheme in ("http", "https", "all"):
+        proxy = proxy_info.get(scheme)
+        if proxy:
+            mounts[f"{scheme}://"] = proxy if "://" in proxy else f"http://{proxy}"
+    for host in no_proxy_hosts:
+        if "://" in host:
+            mounts[host] = None
+        elif ":" in host:
+            mounts[f"all://[{host}]"] = None
+        elif host.lower() == "localhost" or host.replace(".", "").isdigit():
+            mounts[f"all://{host}"] = None
+        else:
+            mounts[f"all://*{host}"] = None
+    return mounts
+
+
+def _build_http_session() -> httpx.AsyncClient:
+    """Create an HTTP/2 client so all requests of a query share one multiplexed connection"""
+    limits = httpx.Limits(max_connections=16)
+
+    def retrying_transport(proxy: str | None = None) -> _RetryTransport:
+        # httpx ignores the client's http2/limits/proxy settings once a transport is given,
+        # so they are configured on each transport instead
+        return _RetryTransport(httpx.AsyncHTTPTransport(http2=True, retries=3, limits=limits, proxy=proxy))
+
+    # Env proxies are not applied automatically with a custom transport either; None mounts
+    # (NO_PROXY hosts) fall back to the direct default transport
+    mounts = {
+        pattern: retrying_transport(proxy) if proxy else None
+        for pattern, proxy in _environment_proxy_mounts().items()
+    }
+    # brotli must be installed for httpx to decode br responses
+    return httpx.AsyncClient(
+        transport=retrying_transport(),
+        mounts=mounts,
+        # Follow redirects from the instance and login hosts, as requests did
+        follow_redirects=True,
+        timeout=httpx.Timeout(60.0),
+        headers={
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, br",
+        },
+    )
+
+
 class OAuthSession:
     def __init__(self, config: OAuthConfig):
         self.config = config
         self.token: str | None = None
         self.exp: datetime | None = None
         self.instance_url: str | None = None
+        self.session: httpx.AsyncClient = _build_http_session()
+        # Serializes concurrent tool calls so only one OAuth flow runs at a time
+        self._auth_lock = asyncio.Lock()
 
-    def _run_oauth_flow(self, scopes: list[str]):
+    async def _run_oauth_flow(self, scopes: list[str]):
         logger.info(f"Starting OAuth flow with scopes: {scopes}")
         login_url = f"https://{self.config.login_root}/services/oauth2/authorize"
         token_exchange_url = f"https://{self.config.login_root}/services/oauth2/token"
@@ -127,8 +248,8 @@ class OAuthSession:
         logger.info(f"Opening browser for OAuth authorization")
         logger.debug(f"Browser URI: {browser_uri}")
         webbrowser.open_new_tab(browser_uri)
-        while t.is_alive():
-            t.join(10)
+        # Wait for the callback off the event loop so other tools keep running
+        await asyncio.to_thread(t.join)
 
         oauth_result_args = server.oauth_result
 
@@ -143,9 +264,11 @@ class OAuthSession:
         code = oauth_result_args["code"][0]
         logger.info(f"Authorization code received, exchanging for access token")
 
-        response = requests.post(
+        # Reuse the shared client's connection pool. The authorization code is single-use, so a
+        # retry after the server already redeemed it could only fail with invalid_grant.
+        response = await self.session.post(
             token_exchange_url,
-            {
+            data={
                 "grant_type": "authorization_code",
                 "code": code,
                 "client_id": self.config.client_id,
@@ -153,7 +276,7 @@ class OAuthSession:
                 "redirect_uri": redirect_uri,
                 "code_verifier": code_verifier,
             },
-            headers={"Accept": "application/json"},
+            extensions={NO_STATUS_RETRY: True},
         )
 
         logger.info(f"Token exchange response: status={response.status_code}, elapsed={response.elapsed.total_seconds():.2f}s")
@@ -166,23 +289,32 @@ class OAuthSession:
         logger.info("Successfully obtained access token")
         return response.json()
 
-    def ensure_access(self) -> str:
-        if self.exp is not None and datetime.now() > self.exp:
-            self.exp = None
-            self.token = None
-
-        if self.token is None:
-            auth_info = self._run_oauth_flow(
-                ["api", "cdp_query_api", "cdp_profile_api"])
-            self.token = auth_info["access_token"]
-            self.exp = datetime.now() + timedelta(minutes=110)
-            self.instance_url = auth_info["instance_url"]
-
-        return self.token
-
-    def get_token(self) -> str:
-        return self.ensure_access()
-
-    def get_instance_url(self) -> str:
-        self.ensure_access()
+    async def ensure_access(self) -> str:
+        async with self._auth_lock:
+            if self.exp is not None and datetime.now() > self.exp:
+                self.exp = None
+                self.token = None
+                # Do not send the expired token to the token endpoint
+                self.session.headers.pop("Authorization", None)
+
+            if self.token is None:
+                auth_info = await self._run_oauth_flow(
+                    ["api", "cdp_query_api", "cdp_profile_api"])
+                self.token = auth_info["access_token"]
+                self.exp = datetime.now() + timedelta(minutes=110)
+                self.instance_url = auth_info["instance_url"]
+                self.session.headers["Authorization"] = f"Bearer {self.token}"
+
+            return self.token
+
+    async def get_token(self) -> str:
+        return await self.ensure_access()
+
+    async def get_instance_url(self) -> str:
+        await self.ensure_access()
         return self.instance_url
+
+    async def get_authorized_session(self) -> Tuple[str, httpx.AsyncClient]:
+        """Return the instance URL and the shared session, whose Authorization header is set when a token is minted"""
+        await self.ensure_access()
+        return self.instance_url, self.session
@@ -1,8 +1,9 @@
 import json
 import logging
+import threading
+from cachetools import TTLCache
 from mcp.server.fastmcp import FastMCP
 from pydantic import Field
-import requests
 import os
 from oauth import OAuthConfig, OAuthSession
 from connect_api_dc_sql import run_query
@@ -20,35 +21,50 @@ oauth_session: OAuthSession = OAuthSession(sf_org)
 
 # Non-auth configuration
 DEFAULT_LIST_TABLE_FILTER = os.getenv('DEFAULT_LIST_TABLE_FILTER', '%')
+METADATA_CACHE_TTL = int(os.getenv('METADATA_CACHE_TTL', '60'))
+
+# Catalog metadata rarely changes within a session, so list/describe results are cached briefly.
+# Keys include the instance URL so results from a different org are never served.
+_metadata_cache: TTLCache = TTLCache(maxsize=256, ttl=METADATA_CACHE_TTL)
+_metadata_cache_lock = threading.Lock()
+
+
+async def _run_cached_column_query(key: tuple, sql: str, parameters: list[dict[str, str]]) -> list[str]:
+    with _metadata_cache_lock:
+        cached = _metadata_cache.get((oauth_session.instance_url, *key))
+    if cached is not None:
+        return cached
+
+    result = await run_query(oauth_session, sql, parameters=parameters, flatten_column=0)
+    data = result.get("data", [])
+    with _metadata_cache_lock:
+        _metadata_cache[(oauth_session.instance_url, *key)] = data
+    return data
 
 
 @mcp.tool(description="Executes a SQL query and returns the results")
-def query(
+async def query(
     sql: str = Field(
         description="A SQL query in the PostgreSQL dialect make sure to always quote all identifies and use the exact casing. To formulate the query first verify which tables and fields to use through the suggest fields tool (or if it is broken through the list tables / describe tables call). Before executing the tool provide the user a succinct summary (targeted to low code users) on the semantics of the query"),
 ):
     # Returns both data and metadata
-    return run_query(oauth_session, sql)
+    return await run_query(oauth_session, sql)
 
 
 @mcp.tool(description="Lists the available tables in the database")
-def list_tables() -> list[str]:
-    sql = "SELECT c.relname AS TABLE_NAME FROM pg_catalog.pg_namespace n, pg_catalog.pg_class c LEFT JOIN pg_catalog.pg_description d ON (c.oid = d.objoid AND d.objsubid = 0  and d.classoid = 'pg_class'::regclass) WHERE c.relnamespace = n.oid AND c.relname LIKE '%s'" % DEFAULT_LIST_TABLE_FILTER
-    result = run_query(oauth_session, sql)
-    # Extract data from the result dictionary
-    data = result.get("data", [])
-    return [x[0] for x in data]
+async def list_tables() -> list[str]:
+    sql = "SELECT c.relname AS TABLE_NAME FROM pg_catalog.pg_namespace n, pg_catalog.pg_class c LEFT JOIN pg_catalog.pg_description d ON (c.oid = d.objoid AND d.objsubid = 0  and d.classoid = 'pg_class'::regclass) WHERE c.relnamespace = n.oid AND c.relname LIKE :filter"
+    return await _run_cached_column_query(("list_tables", DEFAULT_LIST_TABLE_FILTER), sql, [
+        {"type": "Varchar", "name": "filter", "value": DEFAULT_LIST_TABLE_FILTER}])
 
 
 @mcp.tool(description="Describes the columns of a table")
-def describe_table(
+async def describe_table(
     table: str = Field(description="The table name"),
 ) -> list[str]:
-    sql = f"SELECT a.attname FROM pg_catalog.pg_namespace n JOIN pg_catalog.pg_class c ON (c.relnamespace = n.oid) JOIN pg_catalog.pg_attribute a ON (a.attrelid = c.oid) JOIN pg_catalog.pg_type t ON (a.atttypid = t.oid) LEFT JOIN pg_catalog.pg_attrdef def ON (a.attrelid = def.adrelid AND a.attnum = def.adnum) LEFT JOIN pg_catalog.pg_description dsc ON (c.oid = dsc.objoid AND a.attnum = dsc.objsubid) LEFT JOIN pg_catalog.pg_class dc ON (dc.oid = dsc.classoid AND dc.relname = 'pg_class') LEFT JOIN pg_catalog.pg_namespace dn ON (dc.relnamespace = dn.oid AND dn.nspname = 'pg_catalog') WHERE a.attnum > 0 AND NOT a.attisdropped AND c.relname='{table}'"
-    result = run_query(oauth_session, sql)
-    # Extract data from the result dictionary
-    data = result.get("data", [])
-    return [x[0] for x in data]
+    sql = "SELECT a.attname FROM pg_catalog.pg_namespace n JOIN pg_catalog.pg_class c ON (c.relnamespace = n.oid) JOIN pg_catalog.pg_attribute a ON (a.attrelid = c.oid) JOIN pg_catalog.pg_type t ON (a.atttypid = t.oid) LEFT JOIN pg_catalog.pg_attrdef def ON (a.attrelid = def.adrelid AND a.attnum = def.adnum) LEFT JOIN pg_catalog.pg_description dsc ON (c.oid = dsc.objoid AND a.attnum = dsc.objsubid) LEFT JOIN pg_catalog.pg_class dc ON (dc.oid = dsc.classoid AND dc.relname = 'pg_class') LEFT JOIN pg_catalog.pg_namespace dn ON (dc.relnamespace = dn.oid AND dn.nspname = 'pg_catalog') WHERE a.attnum > 0 AND NOT a.attisdropped AND c.relname=:tn"
+    return await _run_cached_column_query(("describe_table", table), sql, [
+        {"type": "Varchar", "name": "tn", "value": table}])
 
 
 if __name__ == "__main__":
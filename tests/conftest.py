@@ -0,0 +1,68 @@
+import os
+import sys
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import orjson
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from oauth import OAuthConfig, OAuthSession  # noqa: E402
+
+
+class FakeConnectAPI:
+    """In-memory stand-in for the Connect API query-sql endpoints"""
+
+    def __init__(self, rows: list, initial_rows: int = 0, page_cap: int | None = None,
+                 metadata: list | None = None):
+        self.rows = rows
+        self.initial_rows = initial_rows
+        self.page_cap = page_cap
+        self.metadata = metadata if metadata is not None else [{"name": "a"}, {"name": "b"}]
+        self.requests: list[httpx.Request] = []
+        self.fail_offsets: set[int] = set()
+
+    @staticmethod
+    def _response(status_code: int, payload) -> httpx.Response:
+        # Streamed like a real network response, so elapsed is set once the body is read
+        body = payload if isinstance(payload, bytes) else orjson.dumps(payload)
+        return httpx.Response(status_code, stream=httpx.ByteStream(body))
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = urlparse(str(request.url)).path
+        params = {k: v[0] for k, v in parse_qs(urlparse(str(request.url)).query).items()}
+
+        if request.method == "POST":
+            return self._response(200, {
+                "status": {"queryId": "q1", "completionStatus": "Running"},
+                "data": self.rows[:self.initial_rows],
+                "metadata": self.metadata,
+            })
+        if path.endswith("/rows"):
+            offset, limit = int(params["offset"]), int(params["rowLimit"])
+            if offset in self.fail_offsets:
+                return self._response(400, [{"message": "{\"primaryMessage\": \"boom\"}"}])
+            if self.page_cap is not None:
+                limit = min(limit, self.page_cap)
+            page = self.rows[offset:offset + limit]
+            return self._response(200, {"data": page, "returnedRows": len(page)})
+        return self._response(200, {"completionStatus": "Finished", "rowCount": len(self.rows)})
+
+    def row_requests(self) -> list[dict[str, str]]:
+        return [{k: v[0] for k, v in parse_qs(urlparse(str(r.url)).query).items()}
+                for r in self.requests if urlparse(str(r.url)).path.endswith("/rows")]
+
+
+@pytest.fixture
+def make_session():
+    def factory(api: FakeConnectAPI) -> OAuthSession:
+        session = OAuthSession(OAuthConfig("client-id", "client-secret",
+                               "login.example.com", "http://localhost:55556/Callback"))
+        session.token = "token"
+        session.instance_url = "https://instance.example.com"
+        session.session = httpx.AsyncClient(transport=httpx.MockTransport(api.handler))
+        return session
+
+    return factory
@@ -0,0 +1,186 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import connect_api_dc_sql
+from connect_api_dc_sql import ConnectAPIError, _error_message, _handle_error_response, run_query
+from conftest import FakeConnectAPI
+
+
+def _rows(count: int) -> list:
+    return [[f"r{i}", i] for i in range(count)]
+
+
+def test_pages_are_reassembled_in_offset_order(make_session):
+    api = FakeConnectAPI(_rows(2500), initial_rows=7)
+    result = asyncio.run(run_query(make_session(api), "SELECT 1", pagination_batch_size=300))
+
+    assert result["data"] == api.rows
+    assert result["metadata"] == api.metadata
+
+
+def test_short_pages_are_completed_from_where_they_ended(make_session):
+    api = FakeConnectAPI(_rows(2500), page_cap=170)
+    result = asyncio.run(run_query(make_session(api), "SELECT 1", pagination_batch_size=300))
+
+    assert result["data"] == api.rows
+
+
+def test_page_size_never_exceeds_server_page_cap(make_session, monkeypatch):
+    # Fast mocked pages would otherwise push the adapted size up
+    monkeypatch.setattr(connect_api_dc_sql, "MIN_PAGINATION_BATCH_SIZE", 1)
+    api = FakeConnectAPI(_rows(3000), page_cap=1000)
+    result = asyncio.run(run_query(make_session(api), "SELECT 1", pagination_batch_size=2000))
+
+    assert result["data"] == api.rows
+    assert max(int(params["rowLimit"]) for params in api.row_requests()[1:]) <= 1000
+    assert len(api.row_requests()) == 3
+
+
+def test_page_size_never_exceeds_requested_batch_size(make_session, monkeypatch):
+    monkeypatch.setattr(connect_api_dc_sql, "MIN_PAGINATION_BATCH_SIZE", 1)
+    api = FakeConnectAPI(_rows(3000))
+    result = asyncio.run(run_query(make_session(api), "SELECT 1", pagination_batch_size=500))
+
+    assert result["data"] == api.rows
+    assert {int(params["rowLimit"]) for params in api.row_requests()} <= set(range(1, 501))
+
+
+def test_arrow_output_uses_metadata_types_across_pages(make_session):
+    pa = pytest.importorskip("pyarrow")
+    rows = [[f"r{i}", i] for i in range(300)] + [[f"r{i}", i + 0.5] for i in range(300, 600)]
+    api = FakeConnectAPI(rows, metadata=[{"name": "a", "type": "VARCHAR"}, {"name": "b", "type": "DECIMAL(18,2)"}])
+    result = asyncio.run(run_query(make_session(api), "SELECT 1", pagination_batch_size=300,
+                                   output_format="arrow"))
+
+    table = result["data"]
+    assert table.schema == pa.schema([("a", pa.string()), ("b", pa.float64())])
+    assert table.column("b").to_pylist() == [row[1] for row in rows]
+
+
+def test_arrow_output_unifies_inferred_types_across_pages(make_session):
+    pytest.importorskip("pyarrow")
+    rows = [[None, i] for i in range(300)] + [[f"r{i}", i + 0.5] for i in range(300, 600)]
+    api = FakeConnectAPI(rows)
+    result = asyncio.run(run_query(make_session(api), "SELECT 1", pagination_batch_size=300,
+                                   output_format="arrow"))
+
+    assert result["data"].to_pylist() == [{"a": a, "b": b} for a, b in rows]
+
+
+def test_failed_page_cancels_remaining_fetches(make_session):
+    api = FakeConnectAPI(_rows(3000))
+    api.fail_offsets.add(600)
+    handle = api.handler
+    in_flight: list[int] = []
+
+    async def slow_handler(request):
+        # Pages other than the failing one stay in flight until they are cancelled
+        response = handle(request)
+        if request.url.path.endswith("/rows") and response.is_success and request.url.params["offset"] != "0":
+            in_flight.append(1)
+            await asyncio.sleep(10)
+        return response
+
+    api.handler = slow_handler
+
+    async def main():
+        with pytest.raises(ConnectAPIError) as error:
+            await run_query(make_session(api), "SELECT 1", pagination_batch_size=300)
+        assert error.value.status == 400
+        assert in_flight
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    asyncio.run(main())
+
+
+def test_flatten_column_projects_initial_rows_and_pages(make_session):
+    api = FakeConnectAPI(_rows(1000), initial_rows=5, page_cap=130)
+    result = asyncio.run(run_query(make_session(api), "SELECT 1", pagination_batch_size=300,
+                                   flatten_column=1))
+
+    assert result["data"] == list(range(1000))
+
+
+def _error_body(details: dict | None = None, message: str | None = None) -> bytes:
+    # Connect API errors carry their details as a JSON string nested in the outer payload
+    return json.dumps([{"message": message if message is not None else json.dumps(details),
+                        "errorCode": "QUERY_ERROR"}]).encode()
+
+
+@pytest.mark.parametrize("primary_message", [
+    "Table not found",
+    'Table "Account" not found',
+    "Path C:\\data\\file is invalid",
+    "Colonne \u00e9l\u00e8ve inconnue \u2014 \u2603",
+    'Mixed "quotes\\" and\nnewlines\t',
+])
+def test_error_message_extracts_nested_primary_message_and_hint(primary_message):
+    body = _error_body({"primaryMessage": primary_message, "customerHint": 'Check "the" name', "errorCode": 7})
+
+    assert _error_message(body) == f'{primary_message} Hint: Check "the" name'
+
+
+def test_error_message_without_customer_hint():
+    assert _error_message(_error_body({"primaryMessage": "Syntax error"})) == "Syntax error"
+
+
+def test_error_message_matches_unnested_fields():
+    body = json.dumps({"primaryMessage": 'Plain "message"', "customerHint": "hint"}).encode()
+
+    assert _error_message(body) == 'Plain "message" Hint: hint'
+
+
+def test_error_message_falls_back_to_nested_details_json():
+    details = json.dumps({"errorCode": "E1", "detail": "no primary message"})
+
+    assert _error_message(_error_body(message=details)) == details
+
+
+@pytest.mark.parametrize("body", [b"Service Unavailable", b"", _error_body(message="not json"), b"{}"])
+def test_error_message_returns_none_for_unrecognised_bodies(body):
+    assert _error_message(body) is None
+
+
+def test_error_message_is_cached_per_body():
+    body = _error_body({"primaryMessage": "Cached once"})
+    _error_message(body)
+    hits = _error_message.cache_info().hits
+
+    assert _error_message(body) == "Cached once"
+    assert _error_message.cache_info().hits == hits + 1
+
+
+def _response(status_code: int, content: bytes) -> httpx.Response:
+    return httpx.Response(status_code, content=content, request=httpx.Request("GET", "https://instance.example.com"))
+
+
+def test_handle_error_response_ignores_success():
+    assert _handle_error_response(_response(200, b"not even json")) is None
+
+
+def test_handle_error_response_raises_connect_api_error():
+    with pytest.raises(ConnectAPIError) as error:
+        _handle_error_response(_response(400, _error_body({"primaryMessage": "Bad SQL", "customerHint": "Quote it"})))
+
+    assert (error.value.status, error.value.reason, error.value.message) == (400, "Bad Request", "Bad SQL Hint: Quote it")
+    assert error.value.args == (400, "Bad Request", "Bad SQL Hint: Quote it")
+
+
+def test_handle_error_response_falls_back_to_raw_text():
+    with pytest.raises(ConnectAPIError) as error:
+        _handle_error_response(_response(503, b"upstream unavailable"))
+
+    assert error.value.message == "upstream unavailable"
+
+
+def test_arrow_output_rejects_old_pyarrow(make_session, monkeypatch):
+    pa = pytest.importorskip("pyarrow")
+    monkeypatch.setattr(pa, "__version__", "13.0.0")
+    api = FakeConnectAPI(_rows(10))
+
+    with pytest.raises(ImportError, match="pyarrow>=14"):
+        asyncio.run(run_query(make_session(api), "SELECT 1", output_format="arrow"))
+    assert api.requests == []
@@ -0,0 +1,241 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+import oauth
+from oauth import _RetryTransport, _build_http_session
+
+
+def _send(transport: httpx.AsyncBaseTransport, method: str = "GET") -> httpx.Response:
+    async def send():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.request(method, "https://instance.example.com/")
+
+    return asyncio.run(send())
+
+
+def _flaky_transport(statuses: list[int], calls: list[httpx.Request],
+                     headers: dict[str, str] | None = None) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        status_code = statuses[min(len(calls), len(statuses)) - 1]
+        # Streamed like a real network response, so elapsed is set once the body is read
+        return httpx.Response(status_code, headers=headers if status_code >= 400 else None,
+                              stream=httpx.ByteStream(b"{}"))
+
+    return httpx.MockTransport(handler)
+
+
+def test_retry_transport_retries_transient_statuses():
+    calls: list[httpx.Request] = []
+    response = _send(_RetryTransport(_flaky_transport([503, 429, 200], calls), backoff_factor=0), "POST")
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+def test_retry_transport_returns_last_response_when_retries_run_out():
+    calls: list[httpx.Request] = []
+    response = _send(_RetryTransport(_flaky_transport([502], calls), total=3, backoff_factor=0))
+
+    assert response.status_code == 502
+    assert len(calls) == 4
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list[float]:
+    delays: list[float] = []
+
+    async def fake_sleep(delay: float):
+        delays.append(delay)
+
+    monkeypatch.setattr(oauth.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def test_retry_transport_backs_off_exponentially(sleeps):
+    calls: list[httpx.Request] = []
+    _send(_RetryTransport(_flaky_transport([503, 503, 503, 200], calls), backoff_factor=0.2))
+
+    assert sleeps == pytest.approx([0.2, 0.4, 0.8])
+
+
+def test_retry_transport_honours_retry_after_seconds(sleeps):
+    calls: list[httpx.Request] = []
+    response = _send(_RetryTransport(_flaky_transport([429, 200], calls, headers={"Retry-After": "7"}),
+                                     backoff_factor=0.2))
+
+    assert response.status_code == 200
+    assert sleeps == [7.0]
+
+
+def test_retry_transport_honours_retry_after_http_date(sleeps):
+    retry_at = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    calls: list[httpx.Request] = []
+    _send(_RetryTransport(_flaky_transport([503, 200], calls, headers={"Retry-After": retry_at})))
+
+    assert 25 <= sleeps[0] <= 30
+
+
+def test_retry_transport_caps_retry_after(sleeps):
+    calls: list[httpx.Request] = []
+    _send(_RetryTransport(_flaky_transport([429, 200], calls, headers={"Retry-After": "3600"}),
+                          max_retry_after=60))
+
+    assert sleeps == [60]
+
+
+def test_retry_transport_keeps_backoff_when_retry_after_is_shorter_or_invalid(sleeps):
+    calls: list[httpx.Request] = []
+    _send(_RetryTransport(_flaky_transport([429, 429, 200], calls, headers={"Retry-After": "0"}),
+                          backoff_factor=0.5))
+    _send(_RetryTransport(_flaky_transport([503, 200], [], headers={"Retry-After": "soon"}),
+                          backoff_factor=0.5))
+
+    assert sleeps == pytest.approx([0.5, 1.0, 0.5])
+
+
+def test_retry_transport_ignores_retry_after_on_other_statuses(sleeps):
+    _send(_RetryTransport(_flaky_transport([500, 200], [], headers={"Retry-After": "30"}),
+                          backoff_factor=0.2))
+
+    assert sleeps == pytest.approx([0.2])
+
+
+def test_retry_transport_does_not_retry_client_errors():
+    calls: list[httpx.Request] = []
+    response = _send(_RetryTransport(_flaky_transport([400, 200], calls), backoff_factor=0))
+
+    assert response.status_code == 400
+    assert len(calls) == 1
+
+
+class _RecordingHTTPTransport(httpx.MockTransport):
+    """Stands in for httpx.AsyncHTTPTransport, recording its settings and the requests it handles"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.handled: list[httpx.Request] = []
+        super().__init__(self._handle)
+
+    def _handle(self, request: httpx.Request) -> httpx.Response:
+        self.handled.append(request)
+        return httpx.Response(200, stream=httpx.ByteStream(b"{}"))
+
+
+@pytest.fixture
+def http_transports(monkeypatch) -> list[_RecordingHTTPTransport]:
+    transports: list[_RecordingHTTPTransport] = []
+
+    def factory(**kwargs) -> _RecordingHTTPTransport:
+        transports.append(_RecordingHTTPTransport(**kwargs))
+        return transports[-1]
+
+    monkeypatch.setattr(oauth.httpx, "AsyncHTTPTransport", factory)
+    return transports
+
+
+def _get(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    async def send():
+        async with client:
+            return await client.get(url)
+
+    return asyncio.run(send())
+
+
+def test_http_session_applies_limits_to_its_transport(monkeypatch, http_transports):
+    monkeypatch.setattr(oauth, "getproxies", lambda: {})
+    client = _build_http_session()
+
+    assert len(http_transports) == 1
+    transport = http_transports[0]
+    assert transport.kwargs["http2"] is True
+    assert transport.kwargs["limits"].max_connections == 16
+    assert transport.kwargs["proxy"] is None
+
+    _get(client, "https://instance.example.com/services/data")
+    assert len(transport.handled) == 1
+
+
+def test_http_session_follows_redirects(monkeypatch, http_transports):
+    monkeypatch.setattr(oauth, "getproxies", lambda: {})
+    client = _build_http_session()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        http_transports[0].handled.append(request)
+        if request.url.path == "/old":
+            return httpx.Response(302, headers={"Location": "https://instance.example.com/new"})
+        return httpx.Response(200, stream=httpx.ByteStream(b"{}"))
+
+    http_transports[0].handler = handler
+    response = _get(client, "https://instance.example.com/old")
+
+    assert response.status_code == 200
+    assert [request.url.path for request in http_transports[0].handled] == ["/old", "/new"]
+
+
+def _handled_by(transports: list[_RecordingHTTPTransport], url: str) -> str | None:
+    handlers = [transport for transport in transports if any(
+        str(request.url) == url for request in transport.handled)]
+    assert len(handlers) == 1
+    return handlers[0].kwargs["proxy"]
+
+
+def test_http_session_honours_environment_proxies(monkeypatch, http_transports):
+    monkeypatch.setattr(oauth, "getproxies", lambda: {
+        "https": "proxy.corp:3128", "no": "localhost, .internal.example.com"})
+
+    urls = ["https://instance.example.com/", "https://api.internal.example.com/", "https://localhost:8443/"]
+    for url in urls:
+        _get(_build_http_session(), url)
+
+    assert _handled_by(http_transports, urls[0]) == "http://proxy.corp:3128"
+    assert _handled_by(http_transports, urls[1]) is None
+    assert _handled_by(http_transports, urls[2]) is None
+    assert all(transport.kwargs["limits"].max_connections == 16 for transport in http_transports)
+
+
+def test_no_proxy_wildcard_disables_environment_proxies(monkeypatch):
+    monkeypatch.setattr(oauth, "getproxies", lambda: {"https": "http://proxy.corp:3128", "no": "*"})
+
+    assert oauth._environment_proxy_mounts() == {}
+
+
+def test_retry_transport_skips_requests_that_opt_out():
+    calls: list[httpx.Request] = []
+
+    async def send():
+        transport = _RetryTransport(_flaky_transport([503, 200], calls), backoff_factor=0)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.post("https://login.example.com/services/oauth2/token",
+                                     data={"code": "single-use"}, extensions={oauth.NO_STATUS_RETRY: True})
+
+    response = asyncio.run(send())
+
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+
+def test_token_exchange_is_not_retried(monkeypatch):
+    class FakeCallbackServer:
+        def __init__(self, address, handler):
+            self.oauth_result = {"code": ["single-use"]}
+
+        def handle_request(self):
+            pass
+
+    monkeypatch.setattr(oauth.http.server, "HTTPServer", FakeCallbackServer)
+    monkeypatch.setattr(oauth.webbrowser, "open_new_tab", lambda uri: None)
+    calls: list[httpx.Request] = []
+    session = oauth.OAuthSession(oauth.OAuthConfig("client-id", "client-secret",
+                                 "login.example.com", "http://localhost:55556/Callback"))
+    session.session = httpx.AsyncClient(
+        transport=_RetryTransport(_flaky_transport([503, 200], calls), backoff_factor=0))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(session.ensure_access())
+    assert len(calls) == 1
+    assert calls[0].url.path == "/services/oauth2/token"
@@ -0,0 +1,97 @@
+import asyncio
+import os
+
+import httpx
+import orjson
+import pytest
+
+# server.py builds its OAuth config from the environment at import time
+os.environ.setdefault("SF_CLIENT_ID", "client-id")
+os.environ.setdefault("SF_CLIENT_SECRET", "client-secret")
+
+import server  # noqa: E402
+from conftest import FakeConnectAPI  # noqa: E402
+
+
+@pytest.fixture
+def api(monkeypatch) -> FakeConnectAPI:
+    api = FakeConnectAPI([["Id"], ["Name"], ["Industry"]], initial_rows=3,
+                         metadata=[{"name": "attname", "type": "VARCHAR"}])
+    monkeypatch.setattr(server.oauth_session, "token", "token")
+    monkeypatch.setattr(server.oauth_session, "instance_url", "https://instance.example.com")
+    monkeypatch.setattr(server.oauth_session, "session",
+                        httpx.AsyncClient(transport=httpx.MockTransport(api.handler)))
+    monkeypatch.setattr(server, "_metadata_cache", server.TTLCache(maxsize=256, ttl=60))
+    return api
+
+
+def _submitted_queries(api: FakeConnectAPI) -> list[dict]:
+    return [orjson.loads(request.content) for request in api.requests if request.method == "POST"]
+
+
+def test_describe_table_binds_table_name_as_parameter(api):
+    table = "x' OR 1=1"
+    columns = asyncio.run(server.describe_table(table=table))
+
+    assert columns == ["Id", "Name", "Industry"]
+    (submitted,) = _submitted_queries(api)
+    assert table not in submitted["sql"]
+    assert "c.relname=:tn" in submitted["sql"]
+    assert submitted["sqlParameters"] == [{"type": "Varchar", "name": "tn", "value": table}]
+
+
+def test_list_tables_binds_filter_as_parameter(api, monkeypatch):
+    monkeypatch.setattr(server, "DEFAULT_LIST_TABLE_FILTER", "Curated%' OR '1'='1")
+    tables = asyncio.run(server.list_tables())
+
+    assert tables == ["Id", "Name", "Industry"]
+    (submitted,) = _submitted_queries(api)
+    assert "Curated" not in submitted["sql"]
+    assert "c.relname LIKE :filter" in submitted["sql"]
+    assert submitted["sqlParameters"] == [
+        {"type": "Varchar", "name": "filter", "value": "Curated%' OR '1'='1"}]
+
+
+def test_repeated_metadata_calls_are_served_from_cache(api):
+    async def main():
+        first_tables = await server.list_tables()
+        first_columns = await server.describe_table(table="Account")
+        requests_sent = len(api.requests)
+        assert await server.list_tables() == first_tables
+        assert await server.describe_table(table="Account") == first_columns
+        return requests_sent
+
+    requests_sent = asyncio.run(main())
+
+    assert len(api.requests) == requests_sent
+    assert len(_submitted_queries(api)) == 2
+
+
+def test_cache_misses_for_another_table_or_instance(api, monkeypatch):
+    async def main():
+        await server.describe_table(table="Account")
+        await server.describe_table(table="Contact")
+        monkeypatch.setattr(server.oauth_session, "instance_url", "https://other.example.com")
+        await server.describe_table(table="Account")
+
+    asyncio.run(main())
+
+    assert [query["sqlParameters"][0]["value"] for query in _submitted_queries(api)] == [
+        "Account", "Contact", "Account"]
+
+
+def test_cache_entries_expire_after_ttl(api, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(server, "_metadata_cache",
+                        server.TTLCache(maxsize=256, ttl=60, timer=lambda: now[0]))
+
+    async def main():
+        await server.list_tables()
+        now[0] = 59
+        await server.list_tables()
+        now[0] = 61
+        await server.list_tables()
+
+    asyncio.run(main())
+
+    assert len(_submitted_queries(api)) == 2